@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
-from .draw_table import draw_table
+from .draw_table import (draw_table, draw_table_pages,
+                         TableFileReader, LazyTable, TableFormatter, TableStreamHandler)
 
-__all__ = ['draw_table']
+__all__ = ['draw_table', 'draw_table_pages',
+           'TableFileReader', 'LazyTable', 'TableFormatter', 'TableStreamHandler']
@@ -4,6 +4,16 @@
 Simple table drawing library
 """
 
+# standard library
+import builtins
+import codecs
+import logging
+import mmap
+import re
+import shutil
+import struct
+import sys
+
 # default values are for reStructuredText grid tables (e.g. for sphinx)
 HEADERS_ROW_SEP_CHAR = "="
 ROW_SEP_CHAR =         "-"
@@ -13,9 +23,18 @@ CELL_SEP_CHAR =        "|"
 DEFAULT_VALUE =        "-"
 NEWLINE =              '\n'
 MIN_H_PADDING = 1   # the minimum horizontal padding on each side of a cell value
+ELLIPSIS =             "..."
+TERMINAL_WIDTH = 'terminal'  # max_table_width: terminal width when printing to a terminal
 
 SUPPORTED_NEWLINES = '\n \r \r\n'.split(' ')
 
+# RecursionError is new in Python 3.5
+_RecursionError = getattr(builtins, 'RecursionError', RuntimeError)
+
+_DEFAULT = object()  # default value of optional arguments which accept None
+
+ROW_INDEX_ENTRY = struct.Struct('<QQ')  # start and end byte offsets of a data row in a row index file
+
 
 class SimpleTableError(ValueError):
     pass
@@ -33,7 +52,9 @@ class Table:
                  min_h_padding=MIN_H_PADDING,
                  column_keys=None,
                  default_value=DEFAULT_VALUE,
-                 newline=NEWLINE):
+                 newline=NEWLINE,
+                 max_table_width=TERMINAL_WIDTH,
+                 ellipsis=ELLIPSIS):
         """
         For arguments documentation see the `py_draw_table()` function
         """
@@ -48,6 +69,18 @@ class Table:
         self.column_keys = column_keys
         self.default_value = str(default_value)
         self.newline = str(newline)
+        self.ellipsis = str(ellipsis)
+
+        # the terminal width only applies to tables drawn as strings, not to streams and files
+        self._terminal_width = max_table_width == TERMINAL_WIDTH
+        if self._terminal_width:
+            max_table_width = self._get_terminal_width()
+        if max_table_width is not None:
+            try:
+                max_table_width = int(max_table_width)
+            except (TypeError, ValueError):
+                raise SimpleTableError("max_table_width must be an integer: '{}'".format(max_table_width))
+        self.max_table_width = max_table_width
 
         if not self.data:
             raise SimpleTableError('No data received')
@@ -71,9 +104,7 @@ class Table:
         self.column_widths = self.row_separator = self.header_row_separator = None
 
     def draw(self):
-        self.column_widths = self._get_column_widths()
-        self.row_separator = self._build_row_sep()
-        self.header_row_separator = self._build_row_sep(row_sep_char=self.header_row_sep_char)
+        self._init_drawing()
 
         return ('{row_sep}{newline}'
                 '{header}{newline}'
@@ -87,6 +118,145 @@ class Table:
                                           self.row_separator for row in self.data]),
                                       newline=self.newline)
 
+    def draw_to(self, stream):
+        """
+        Writes the table to stream row by row, without building the whole table string,
+        max_table_width applies only if explicitly given
+        :param stream: a text file-like object
+        """
+        self._init_drawing(max_table_width=None if self._terminal_width else self.max_table_width)
+
+        stream.write('{row_sep}{newline}'
+                     '{header}{newline}'
+                     '{header_sep}'.format(row_sep=self.row_separator,
+                                           header=self._build_row(self.headers),
+                                           header_sep=self.header_row_separator,
+                                           newline=self.newline))
+        for row in self.data:
+            stream.write(self.newline + self._build_row(row) + self.newline + self.row_separator)
+
+    def draw_to_file(self, path, index_path=None, encoding='utf-8'):
+        """
+        Writes the table to a file, row by row, optionally with an index file containing
+        the start and end byte offsets of each data row (see `TableFileReader`),
+        max_table_width applies only if explicitly given
+        :param path: The path of the table file
+        :param index_path: The path of the index file, None for no index
+        :param encoding: The encoding of the table file
+        """
+        self._init_drawing(max_table_width=None if self._terminal_width else self.max_table_width)
+        # a single encoder for the whole file: byte order marks are only written once
+        encode = codecs.getincrementalencoder(encoding)().encode
+        row_separator = self.newline + self.row_separator
+
+        index_file = open(index_path, 'wb') if index_path is not None else None
+        try:
+            with open(path, 'wb') as table_file:
+                offset = table_file.write(encode('{row_sep}{newline}'
+                                                 '{header}{newline}'
+                                                 '{header_sep}'.format(row_sep=self.row_separator,
+                                                                       header=self._build_row(self.headers),
+                                                                       header_sep=self.header_row_separator,
+                                                                       newline=self.newline)))
+                for row in self.data:
+                    offset += table_file.write(encode(self.newline))
+                    row_start = offset
+                    offset += table_file.write(encode(self._build_row(row) + row_separator))
+                    if index_file is not None:
+                        index_file.write(ROW_INDEX_ENTRY.pack(row_start, offset))
+                table_file.write(encode('', final=True))
+        finally:
+            if index_file is not None:
+                index_file.close()
+
+    def draw_pages(self, page_width=None, key_columns=0):
+        """
+        Generates the table split in pages of columns, each page fitting in page_width,
+        column widths are computed once for all pages. Pages with columns wider than
+        page_width on their own get those columns shrunk and their values truncated.
+        :param page_width: The maximum width of a page (in characters), at most max_table_width,
+                           None for max_table_width
+        :param key_columns: The number of leading columns repeated on every page
+        :return: a generator of strings containing a printable table, one per page
+        """
+        if page_width is None or self.max_table_width is not None and self.max_table_width < page_width:
+            page_width = self.max_table_width
+
+        column_widths = self._get_column_widths()
+        for column_indexes in self._get_column_pages(column_widths, page_width, key_columns):
+            page_widths = self._fit_column_widths([column_widths[column_index]
+                                                   for column_index in column_indexes],
+                                                  max_table_width=page_width)
+            row_separator = self._build_row_sep(column_widths=page_widths)
+            header_row_separator = self._build_row_sep(row_sep_char=self.header_row_sep_char,
+                                                       column_widths=page_widths)
+            headers = [self.headers[column_index] for column_index in column_indexes]
+
+            yield ('{row_sep}{newline}'
+                   '{header}{newline}'
+                   '{header_sep}{newline}'
+                   '{data_rows}').format(row_sep=row_separator,
+                                         header=self._build_row(headers, page_widths, truncate=True),
+                                         header_sep=header_row_separator,
+                                         data_rows=self.newline.join([
+                                             self._build_row([row[column_index]
+                                                              for column_index in column_indexes],
+                                                             page_widths,
+                                                             truncate=True) +
+                                             self.newline +
+                                             row_separator for row in self.data]),
+                                         newline=self.newline)
+
+    def _init_drawing(self, max_table_width=_DEFAULT):
+        """
+        Computes the column widths and row separators used to draw the table
+        :param max_table_width: the maximum width of the table, None for no limit,
+                                defaults to self.max_table_width
+        """
+        self.column_widths = self._fit_column_widths(self._get_column_widths(), max_table_width)
+        self.row_separator = self._build_row_sep()
+        self.header_row_separator = self._build_row_sep(row_sep_char=self.header_row_sep_char)
+
+    def _get_column_pages(self, column_widths, page_width, key_columns):
+        """
+        Splits the columns in pages fitting in page_width
+        :param column_widths: a list of column widths as returned by _get_column_widths()
+        :param page_width: the maximum width of a page (in characters), None for no limit
+        :param key_columns: the number of leading columns repeated on every page
+        :return: a list of pages, each a list of column indexes
+        """
+        if page_width is None:
+            return [list(range(len(column_widths)))]
+        key_columns = max(min(key_columns, len(column_widths)), 0)
+        key_indexes = list(range(key_columns))
+        # a cell_sep_char (or corner_char) for each column plus the first one
+        key_width = sum(column_widths[:key_columns]) + key_columns + 1
+
+        pages = []
+        page = []
+        width = key_width
+        for column_index in range(key_columns, len(column_widths)):
+            column_width = column_widths[column_index] + 1
+            if page and width + column_width > page_width:
+                pages.append(key_indexes + page)
+                page = []
+                width = key_width
+            page.append(column_index)
+            width += column_width
+
+        if page or not pages:
+            pages.append(key_indexes + page)
+        return pages
+
+    @staticmethod
+    def _get_terminal_width():
+        """Returns the terminal width (in characters) if stdout is a terminal, None otherwise"""
+        try:
+            interactive = sys.stdout.isatty()
+        except (AttributeError, ValueError):  # no stdout or stdout closed
+            return None
+        return shutil.get_terminal_size().columns if interactive else None
+
     def _split_cell_value(self, value):
         """Splits a given string in lines according to self.newline"""
         return str(value).split(self.newline)
@@ -118,6 +288,65 @@ class Table:
 
         return column_widths
 
+    def _fit_column_widths(self, column_widths, max_table_width=_DEFAULT):
+        """
+        Shrinks the widest columns so that the table fits in max_table_width
+        :param column_widths: a list of column widths as returned by _get_column_widths()
+        :param max_table_width: the maximum width of the table, None for no limit,
+                                defaults to self.max_table_width
+        :return: a list of integers representing the width of each column (in characters)
+        """
+        if max_table_width is _DEFAULT:
+            max_table_width = self.max_table_width
+        if max_table_width is None:
+            return column_widths
+
+        # one cell_sep_char (or corner_char) per column plus the last one
+        available = max_table_width - len(column_widths) - 1
+        if sum(column_widths) <= available:
+            return column_widths
+
+        # the narrowest a shrunk column can get, still showing the ellipsis
+        min_width = self.min_h_padding * 2 + max(len(self.ellipsis), 1)
+
+        # looking for the largest width cap for which the table still fits
+        low, high = min_width, max(column_widths)
+        while low < high:
+            cap = (low + high + 1) // 2
+            if sum(min(width, cap) for width in column_widths) <= available:
+                low = cap
+            else:
+                high = cap - 1
+        fitted_widths = [min(width, low) for width in column_widths]
+
+        # handing out the remaining characters to the capped columns, left to right
+        remaining = available - sum(fitted_widths)
+        for column_index, width in enumerate(column_widths):
+            if remaining <= 0:
+                break
+            if width > low:
+                fitted_widths[column_index] += 1
+                remaining -= 1
+
+        return fitted_widths
+
+    def _truncate_cell_line(self, cell_line, cell_width):
+        """Shortens a cell line not fitting in cell_width, the cut is marked with self.ellipsis
+        e.g.
+        value = "miaomiao", width = 9
+        returns "miao..."
+        assuming self.ellipsis = "..." and self.min_h_padding = 1
+        :param cell_line: A line of a cell value
+        :param cell_width: The total length of the cell (in characters)
+        :returns: string
+        """
+        max_length = cell_width - 2 * self.min_h_padding
+        if len(cell_line) <= max_length:
+            return cell_line
+        if max_length < len(self.ellipsis):
+            return cell_line[:max(max_length, 0)]
+        return cell_line[:max_length - len(self.ellipsis)] + self.ellipsis
+
     def _fill_h_cell_padding(self, cell_line, cell_width):
         """Returns the value with horizontal cell padding filled
         e.g.
@@ -138,27 +367,37 @@ class Table:
             # right padding: the remaining space
             self.cell_fill_char * (cell_width - len(cell_line) - self.min_h_padding))
 
-    def _build_row_sep(self, row_sep_char=None):
+    def _build_row_sep(self, row_sep_char=None, column_widths=None):
         """Builds a row separator
         :param row_sep_char: the character that separates rows
+        :param column_widths: the width of each column, defaults to self.column_widths
         :returns: a row separator string
         """
         if row_sep_char is not None:
             assert len(row_sep_char) == 1, 'row_sep_char must have length 1'
         else:
             row_sep_char = self.row_sep_char
+        if column_widths is None:
+            column_widths = self.column_widths
         return '{}{}{}'.format(self.corner_char,
                                self.corner_char.join([row_sep_char * min_col_length
-                                                      for min_col_length in self.column_widths]),
+                                                      for min_col_length in column_widths]),
                                self.corner_char)
 
-    def _build_row(self, row):
+    def _build_row(self, row, column_widths=None, truncate=None):
         """
         Builds a table row string
         :param row: a list containing the fields of the table row
+        :param column_widths: the width of each column, defaults to self.column_widths
+        :param truncate: whether values too long for their column are truncated,
+                         by default only if the table has a maximum width
         :returns: a table row string
         """
         assert len(row) > 0, 'Row is empty'
+        if column_widths is None:
+            column_widths = self.column_widths
+        if truncate is None:
+            truncate = self.max_table_width is not None
 
         # first we split cell-values in a list of lines in order to support multi-line cell-values
         row = [self._split_cell_value(value) for value in row]
@@ -178,7 +417,9 @@ class Table:
                     value = row[column_index][line_index]
                 except IndexError:
                     value = ""  # if no value for this line we just add an empty line
-                line.append(self._fill_h_cell_padding(value, self.column_widths[column_index]))    # cell padding
+                if truncate:
+                    value = self._truncate_cell_line(value, column_widths[column_index])
+                line.append(self._fill_h_cell_padding(value, column_widths[column_index]))    # cell padding
 
             lines.append('{}{}{}'.format(self.cell_sep_char,  # first |
                                          self.cell_sep_char.join(line),  # values separated by |
@@ -188,6 +429,213 @@ class Table:
         return self.newline.join(lines)
 
 
+class TableFileReader:
+    """
+    Random access to the data rows of a table file written by `Table.draw_to_file()`,
+    through its index file, both files are memory-mapped
+    """
+
+    def __init__(self, path, index_path, encoding='utf-8'):
+        """
+        :param path: The path of the table file
+        :param index_path: The path of the index file
+        :param encoding: The encoding of the table file
+        """
+        self.encoding = encoding
+        with open(path, 'rb') as table_file:
+            self._table_map = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(index_path, 'rb') as index_file:
+            self._index_map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # decoder state after the table headers (e.g. the byte order read from a BOM)
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        decoder.decode(self._table_map[:self._get_row_offsets(0)[0]])
+        self._decoder_state = decoder.getstate()
+
+    def __len__(self):
+        """The number of data rows"""
+        return len(self._index_map) // ROW_INDEX_ENTRY.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_rows(self, start, stop=None):
+        """
+        Returns data rows as they were drawn, each followed by its row separator,
+        separated by newlines
+        :param start: The index of the first data row, negative indexes count from the end
+        :param stop: The index after the last data row, by default only the start row is returned
+        :return: a string
+        """
+        if stop is None:
+            if start < 0:
+                start += len(self)
+            if not 0 <= start < len(self):
+                return ''
+            stop = start + 1
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return ''
+        begin = self._get_row_offsets(start)[0]
+        end = self._get_row_offsets(stop - 1)[1]
+
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        decoder.setstate(self._decoder_state)
+        return decoder.decode(self._table_map[begin:end], final=True)
+
+    def close(self):
+        self._table_map.close()
+        self._index_map.close()
+
+    def _get_row_offsets(self, row_index):
+        """Returns the start and end byte offsets of a data row"""
+        return ROW_INDEX_ENTRY.unpack_from(self._index_map, row_index * ROW_INDEX_ENTRY.size)
+
+
+class LazyTable:
+    """
+    A table drawn on first conversion to string (e.g. when a log record is emitted),
+    the drawn table is memoized. Data is neither copied nor validated until then.
+    """
+    __slots__ = ('headers', 'data', 'kwargs', '_drawn')
+
+    def __init__(self, headers, data, **kwargs):
+        """
+        For arguments documentation see the `draw_table()` function,
+        max_table_width defaults to None (no limit)
+        """
+        kwargs.setdefault('max_table_width', None)
+        self.headers = headers
+        self.data = data
+        self.kwargs = kwargs
+        self._drawn = None
+
+    def __str__(self):
+        if self._drawn is None:
+            self._drawn = self._get_table().draw()
+        return self._drawn
+
+    def draw_to(self, stream):
+        """
+        Writes the table to stream, row by row if it was not drawn yet
+        :param stream: a text file-like object
+        """
+        if self._drawn is None:
+            self._get_table().draw_to(stream)
+        else:
+            stream.write(self._drawn)
+
+    def _get_table(self):
+        return Table(self.headers, self.data, **self.kwargs)
+
+
+class TableFormatter(logging.Formatter):
+    """
+    Formatter able to write LazyTable arguments of a log record straight to a stream
+    (see `TableStreamHandler`) instead of building the whole message string
+    """
+    _TABLE_MARKER = '\0{}\0'
+    _TABLE_MARKER_RE = re.compile('\0([0-9]+)\0')
+    # a printf-style conversion specifier: flags, width, precision, length and type
+    _CONVERSION_RE = re.compile(r'%[#0 +\-]*(\*|[0-9]+)?(?:\.(\*|[0-9]*))?[hlL]?(.)')
+
+    def format_to(self, record, stream):
+        """
+        Writes the formatted record to stream
+        :param record: a log record
+        :param stream: a text file-like object
+        """
+        args = record.args if isinstance(record.args, tuple) else ()
+        tables = [arg for arg in args if isinstance(arg, LazyTable)]
+        if not tables or not self._message_is_plain() or not self._tables_are_plain(record):
+            stream.write(self.format(record))
+            return
+
+        # formatting the record with markers in place of the tables
+        marked_args = []
+        for arg in args:
+            if isinstance(arg, LazyTable):
+                arg = self._TABLE_MARKER.format(tables.index(arg))
+            marked_args.append(arg)
+        marked_record = logging.makeLogRecord(record.__dict__)
+        marked_record.args = tuple(marked_args)
+        parts = self._TABLE_MARKER_RE.split(self.format(marked_record))
+
+        # tables not formatted with '%s' (e.g. '%r') lose their marker
+        if len(parts) != 2 * len(tables) + 1:
+            stream.write(self.format(record))
+            return
+
+        for part_index, part in enumerate(parts):
+            if part_index % 2:
+                tables[int(part)].draw_to(stream)
+            else:
+                stream.write(part)
+
+    def _message_is_plain(self):
+        """
+        Tells whether the format of this formatter only contains bare message fields
+        (e.g. '%(message)s', not '%(message).20s'), otherwise the output of the tables
+        depends on the field format
+        :return: a boolean
+        """
+        fmt = self._style._fmt
+        if isinstance(self._style, logging.StringTemplateStyle):
+            # template fields have no format specification
+            fmt = fmt.replace('$$', '')
+            return '$message' in fmt or '${message}' in fmt
+        if isinstance(self._style, logging.StrFormatStyle):
+            bare_field, field = '{message}', '{message'
+        else:
+            bare_field, field = '%(message)s', '%(message)'
+        return fmt.count(field) == fmt.count(bare_field) > 0
+
+    def _tables_are_plain(self, record):
+        """
+        Tells whether all LazyTable arguments of record are formatted with a bare '%s',
+        otherwise the output of the table depends on the conversion (e.g. '%20s', '%r')
+        :param record: a log record with a tuple of arguments
+        :return: a boolean
+        """
+        arg_index = 0
+        for conversion in self._CONVERSION_RE.finditer(str(record.msg)):
+            width, precision, conversion_type = conversion.groups()
+            if conversion_type == '%':
+                continue
+            # '*' width and precision take their value from the arguments
+            arg_index += (width == '*') + (precision == '*')
+            if arg_index >= len(record.args):
+                return False
+            if isinstance(record.args[arg_index], LazyTable) and conversion.group() != '%s':
+                return False
+            arg_index += 1
+        return True
+
+
+class TableStreamHandler(logging.StreamHandler):
+    """StreamHandler writing LazyTable arguments of log records straight to its stream"""
+
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        self.setFormatter(TableFormatter())
+
+    def emit(self, record):
+        if not isinstance(self.formatter, TableFormatter):
+            super().emit(record)
+            return
+        try:
+            self.formatter.format_to(record, self.stream)
+            self.stream.write(self.terminator)
+            self.flush()
+        except _RecursionError:  # as in logging.StreamHandler.emit()
+            raise
+        except Exception:
+            self.handleError(record)
+
+
 def draw_table(headers,
                table_data,
                row_sep_char=ROW_SEP_CHAR,
@@ -198,7 +646,9 @@ def draw_table(headers,
                min_h_padding=MIN_H_PADDING,
                column_keys=None,
                default_value=DEFAULT_VALUE,
-               newline=NEWLINE):
+               newline=NEWLINE,
+               max_table_width=TERMINAL_WIDTH,
+               ellipsis=ELLIPSIS):
     """
     Builds a string containing a printable table
     :param headers: A list of table headers
@@ -216,6 +666,10 @@ def draw_table(headers,
                           makes sense only if table_data is a list of dicts
     :param newline: New line character(s) used in table data (for multi-line cell content),
                     the same will be used to construct the table
+    :param max_table_width: The maximum width of the table (in characters), the widest columns
+                            are shrunk and their values truncated to fit, None for no limit,
+                            by default the terminal width when stdout is a terminal
+    :param ellipsis: The string marking truncated cell values
     :return: a string containing a printable table
     """
     return Table(headers,
@@ -228,4 +682,61 @@ def draw_table(headers,
                  min_h_padding,
                  column_keys,
                  default_value,
-                 newline).draw()
+                 newline,
+                 max_table_width,
+                 ellipsis).draw()
+
+
+def draw_table_pages(headers,
+                     table_data,
+                     page_width=None,
+                     key_columns=0,
+                     row_sep_char=ROW_SEP_CHAR,
+                     headers_row_sep_char=HEADERS_ROW_SEP_CHAR,
+                     corner_char=CORNER_CHAR,
+                     cell_sep_char=CELL_SEP_CHAR,
+                     cell_fill_char=CELL_FILL_CHAR,
+                     min_h_padding=MIN_H_PADDING,
+                     column_keys=None,
+                     default_value=DEFAULT_VALUE,
+                     newline=NEWLINE,
+                     max_table_width=TERMINAL_WIDTH,
+                     ellipsis=ELLIPSIS):
+    """
+    Builds printable tables, one per page of columns fitting in page_width
+    :param headers: A list of table headers
+    :param table_data: A list of lists or list of dicts (see column keys)
+    :param page_width: The maximum width of a page (in characters), at most max_table_width,
+                       None for max_table_width
+    :param key_columns: The number of leading columns repeated on every page
+    :param row_sep_char: The character that separates rows
+    :param headers_row_sep_char: The character that separates headers row from the next row
+    :param corner_char: The corner character (where row_sep_char and cell_sep_char intersect)
+    :param cell_sep_char: The character which separates cells horizontally
+    :param cell_fill_char: The character used for cell padding (usually a white space)
+    :param min_h_padding: The minimum horizontal padding on each side of the cell value,
+                          must be a positibe integer or 0
+    :param column_keys: The keys of the table_data row dictionaries
+                        (if not given table data is supposed to be a list of lists)
+    :param default_value: Default value for missing fields in table_data,
+                          makes sense only if table_data is a list of dicts
+    :param newline: New line character(s) used in table data (for multi-line cell content),
+                    the same will be used to construct the table
+    :param max_table_width: The maximum width of a page (in characters), None for no limit,
+                            by default the terminal width when stdout is a terminal
+    :param ellipsis: The string marking truncated cell values
+    :return: a generator of strings containing a printable table, one per page
+    """
+    return Table(headers,
+                 table_data,
+                 row_sep_char,
+                 headers_row_sep_char,
+                 corner_char,
+                 cell_sep_char,
+                 cell_fill_char,
+                 min_h_padding,
+                 column_keys,
+                 default_value,
+                 newline,
+                 max_table_width,
+                 ellipsis).draw_pages(page_width, key_columns)
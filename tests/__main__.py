@@ -14,7 +14,7 @@ if __name__ == '__main__':
     # ['-k', 'func_name']  to run only a particular test
     # ['-s']  do not capture stdout/stderr
     pytest_params = []
-    tests = ['table_test.py']
+    tests = ['table_test.py', 'render_paths_test.py']
     tests = [os.path.join(os.path.dirname(__file__), test) for test in tests]
     cl_params = sys.argv[1:]
 
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+"""
+Differential tests: every way of rendering a table must give the same output,
+byte for byte, as the reference implementation on seeded random tables.
+Timings of each render path are printed at the end of the run (see them with -s),
+they are only reported for comparison: no speedup is asserted, as timings depend
+on the machine and would make the tests flaky.
+"""
+
+# standard library
+from collections import defaultdict
+import io
+import logging
+import os.path
+import random
+import tempfile
+import time
+
+# related
+import pytest
+
+# project
+from draw_table import (Table, LazyTable, TableFormatter, TableStreamHandler,
+                        SUPPORTED_NEWLINES, draw_table)
+
+SEEDS = range(300)
+
+# characters used in random cell values, stray newline characters included
+CELL_CHARS = 'ab cdXY|+-=äé€0 \t\n\r'
+
+TIMINGS = defaultdict(float)
+
+
+def reference_draw(headers,
+                   data,
+                   row_sep_char,
+                   headers_row_sep_char,
+                   corner_char,
+                   cell_sep_char,
+                   cell_fill_char,
+                   min_h_padding,
+                   column_keys,
+                   default_value,
+                   newline):
+    """
+    The reference rendering: Table.draw() as of version 1.0.0, do not optimize!
+    """
+    if column_keys is not None:
+        data = [[row_dict.get(column_key, default_value) for column_key in column_keys]
+                for row_dict in data]
+
+    column_widths = [0] * len(data[0])
+    for row in data:
+        for column_index, cell_value in enumerate(row):
+            for line in str(cell_value).split(newline):
+                column_widths[column_index] = max(column_widths[column_index],
+                                                  len(line) + min_h_padding * 2)
+    for column_index, header in enumerate(headers):
+        column_widths[column_index] = max(column_widths[column_index],
+                                          len(header) + min_h_padding * 2)
+
+    def build_row_sep(sep_char):
+        return corner_char + corner_char.join([sep_char * width for width in column_widths]) + corner_char
+
+    def build_row(row):
+        row = [str(value).split(newline) for value in row]
+        lines = []
+        for line_index in range(max(len(cell_lines) for cell_lines in row)):
+            line = []
+            for column_index, cell_lines in enumerate(row):
+                value = cell_lines[line_index] if line_index < len(cell_lines) else ''
+                line.append(cell_fill_char * min_h_padding +
+                            value +
+                            cell_fill_char * (column_widths[column_index] - len(value) - min_h_padding))
+            lines.append(cell_sep_char + cell_sep_char.join(line) + cell_sep_char)
+        return newline.join(lines)
+
+    row_separator = build_row_sep(row_sep_char)
+    return (row_separator + newline +
+            build_row(headers) + newline +
+            build_row_sep(headers_row_sep_char) + newline +
+            newline.join([build_row(row) + newline + row_separator for row in data]))
+
+
+def random_table(seed):
+    """
+    Builds a random table
+    :param seed: The seed of the random generator
+    :return: headers, table data and the other arguments of draw_table() as a dict
+    """
+    rng = random.Random(seed)
+    newline = rng.choice(SUPPORTED_NEWLINES)
+    n_columns = rng.randint(1, 8)
+    n_rows = rng.randint(1, 8)
+
+    def random_line(max_length=12):
+        if rng.random() < 0.2:
+            return ''  # empty cells and empty lines
+        return ''.join(rng.choice(CELL_CHARS) for _ in range(rng.randint(1, max_length)))
+
+    def random_value():
+        if rng.random() < 0.1:
+            return rng.randint(-1000, 1000)
+        # cells with different line counts than their neighbours
+        return newline.join(random_line() for _ in range(rng.choice((1, 1, 1, 2, 3, 5))))
+
+    headers = [random_line().replace('\r', '').replace('\n', '') for _ in range(n_columns)]
+    kwargs = {
+        'row_sep_char':         rng.choice('-=~'),
+        'headers_row_sep_char': rng.choice('=-#'),
+        'corner_char':          rng.choice('+°'),
+        'cell_sep_char':        rng.choice('|:'),
+        'cell_fill_char':       rng.choice(' .'),
+        'min_h_padding':        rng.choice((0, 0, 1, 2, 3)),
+        'column_keys':          None,
+        'default_value':        rng.choice(('-', '', 'n/A', 'missing{}value'.format(newline))),
+        'newline':              newline,
+    }
+
+    if rng.random() < 0.5:
+        data = [[random_value() for _ in range(n_columns)] for _ in range(n_rows)]
+    else:
+        # dicts with missing keys
+        column_keys = rng.sample(range(100), n_columns)
+        kwargs['column_keys'] = column_keys
+        data = [{column_key: random_value() for column_key in column_keys if rng.random() < 0.8}
+                for _ in range(n_rows)]
+    return headers, data, kwargs
+
+
+def draw_to_path(headers, data, kwargs):
+    stream = io.StringIO()
+    Table(headers, data, max_table_width=None, **kwargs).draw_to(stream)
+    return stream.getvalue()
+
+
+def draw_to_file_path(headers, data, kwargs):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table_path = os.path.join(tmp_dir, 'table.txt')
+        Table(headers, data, max_table_width=None, **kwargs).draw_to_file(
+            table_path, os.path.join(tmp_dir, 'table.idx'))
+        with open(table_path, 'rb') as table_file:
+            return table_file.read().decode('utf-8')
+
+
+def table_stream_handler_path(headers, data, kwargs):
+    stream = io.StringIO()
+    handler = TableStreamHandler(stream)
+    handler.setFormatter(TableFormatter('%(message)s'))
+    handler.terminator = ''
+    handler.handle(logging.makeLogRecord({'msg': '%s',
+                                          'args': (LazyTable(headers, data, **kwargs),)}))
+    return stream.getvalue()
+
+
+# all render paths, each returning the table string
+RENDER_PATHS = {
+    'draw':
+        lambda headers, data, kwargs: draw_table(headers, data, max_table_width=None, **kwargs),
+    'draw_fit':
+        lambda headers, data, kwargs: draw_table(headers, data, max_table_width=10 ** 6, **kwargs),
+    'draw_pages':
+        lambda headers, data, kwargs: ''.join(
+            Table(headers, data, max_table_width=None, **kwargs).draw_pages(page_width=10 ** 6)),
+    'draw_to':
+        draw_to_path,
+    'draw_to_file':
+        draw_to_file_path,
+    'lazy_table':
+        lambda headers, data, kwargs: str(LazyTable(headers, data, **kwargs)),
+    'table_stream_handler':
+        table_stream_handler_path,
+}
+
+
+@pytest.fixture(scope='module', autouse=True)
+def timings_report():
+    """Prints the total time spent in each render path"""
+    yield
+    if 'reference' not in TIMINGS:
+        return
+    headers = ['Render path', 'Time (ms)', 'vs reference']
+    data = [[path, '{:.2f}'.format(seconds * 1000), '{:.2f}x'.format(seconds / TIMINGS['reference'])]
+            for path, seconds in sorted(TIMINGS.items(), key=lambda item: item[1])]
+    print()
+    print(draw_table(headers, data, max_table_width=None))
+
+
+def timed(path, render, *args):
+    start = time.perf_counter()
+    result = render(*args)
+    TIMINGS[path] += time.perf_counter() - start
+    return result
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_render_paths(seed):
+    headers, data, kwargs = random_table(seed)
+    expected = timed('reference', lambda: reference_draw(headers, data, **kwargs))
+    for path, render in RENDER_PATHS.items():
+        table_str = timed(path, render, headers, data, kwargs)
+        assert table_str == expected, 'render path {} does not match reference (seed {})'.format(path, seed)
@@ -2,12 +2,16 @@
 
 # standard library
 from functools import partial
+import io
+import logging
+import os
 
 # related
 import pytest
 
 # project
-from draw_table import Table, SimpleTableError
+from draw_table import (Table, SimpleTableError, draw_table_pages, TableFileReader,
+                        LazyTable, TableFormatter, TableStreamHandler)
 
 DUMMY_HEADERS = ['4', '5', '6']
 
@@ -20,6 +24,14 @@ DUMMY_COLUMN_KEYS = [4, 5, 6]
 
 dummy_table = partial(Table, headers=DUMMY_HEADERS, data=DUMMY_DATA)
 
+get_terminal_width = Table._get_terminal_width
+
+
+@pytest.fixture(autouse=True)
+def no_terminal_width(monkeypatch):
+    """Tables get no default maximum width, even if tests run in a terminal (e.g. with -s)"""
+    monkeypatch.setattr(Table, '_get_terminal_width', staticmethod(lambda: None))
+
 
 def test_error_if_no_data():
     with pytest.raises(SimpleTableError):
@@ -417,3 +429,296 @@ def test_draw_example2_cr():
                     "°''''''''''''''''°'''''''''''''''°'''''''''''''''''''''''''''''°")
 
     assert table_str == expected_str, 'draw output does not match'
+
+
+@pytest.mark.parametrize('widths_max_width_expected', [
+    ([10, 10, 10],  None,   [10, 10, 10]),
+    ([10, 10, 10],  34,     [10, 10, 10]),   # fits exactly
+    ([10, 10, 10],  33,     [10, 10, 9]),
+    ([5, 20, 30],   40,     [5, 16, 15]),    # the widest columns shrink
+    ([5, 20, 30],   1,      [5, 5, 5]),      # can't shrink below minimum
+    ([0, 30],       20,     [0, 17]),
+])
+def test_fit_column_widths(widths_max_width_expected):
+    column_widths, max_table_width, expected = widths_max_width_expected
+    table = dummy_table(max_table_width=max_table_width)
+    assert table._fit_column_widths(column_widths) == expected, 'Fitted column widths do not match'
+
+
+@pytest.mark.parametrize('line_width_ellipsis_expected', [
+    ('miaomiao',    10,     '...',  'miaomiao'),
+    ('miaomiao',    9,      '...',  'miao...'),
+    ('miaomiao',    5,      '...',  '...'),
+    ('miaomiao',    4,      '...',  'mi'),
+    ('miaomiao',    6,      '~',    'mia~'),
+    ('miaomiao',    6,      '',     'miao'),
+    ('',            2,      '...',  ''),
+])
+def test_truncate_cell_line(line_width_ellipsis_expected):
+    cell_line, cell_width, ellipsis, expected = line_width_ellipsis_expected
+    table = dummy_table(min_h_padding=1, ellipsis=ellipsis)
+    res = table._truncate_cell_line(cell_line, cell_width)
+    assert res == expected, 'Truncated cell line does not match'
+
+
+def test_draw_max_table_width():
+    headers = ["First name", "Last name", "Address"]
+    table_data = [
+        ["Rick", "Nash", "IceHockey Road\n7260 Davos"],
+        ["Grumpy", "Cat", "Reddit\nThe frontpage of\nthe internet"]
+    ]
+    table_str = Table(headers, table_data, max_table_width=40).draw()
+    expected_str = ('+------------+-----------+-------------+\n'
+                    '| First name | Last name | Address     |\n'
+                    '+============+===========+=============+\n'
+                    '| Rick       | Nash      | IceHocke... |\n'
+                    '|            |           | 7260 Davos  |\n'
+                    '+------------+-----------+-------------+\n'
+                    '| Grumpy     | Cat       | Reddit      |\n'
+                    '|            |           | The fron... |\n'
+                    '|            |           | the inte... |\n'
+                    '+------------+-----------+-------------+')
+
+    assert table_str == expected_str, 'draw output does not match'
+    assert all(len(line) <= 40 for line in table_str.split('\n'))
+
+
+@pytest.mark.parametrize('widths_page_width_keys_expected', [
+    ([5, 5, 5],     100,    0,  [[0, 1, 2]]),
+    ([5, 5, 5],     13,     0,  [[0, 1], [2]]),
+    ([5, 5, 5],     12,     0,  [[0], [1], [2]]),
+    ([5, 5, 5],     1,      0,  [[0], [1], [2]]),   # columns wider than a page
+    ([5, 5, 5],     13,     1,  [[0, 1], [0, 2]]),
+    ([5, 5, 5],     13,     3,  [[0, 1, 2]]),
+    ([3, 5, 5, 5],  16,     1,  [[0, 1], [0, 2], [0, 3]]),
+])
+def test_get_column_pages(widths_page_width_keys_expected):
+    column_widths, page_width, key_columns, expected = widths_page_width_keys_expected
+    table = dummy_table()
+    pages = table._get_column_pages(column_widths, page_width, key_columns)
+    assert pages == expected, 'Column pages do not match'
+
+
+def test_draw_pages():
+    headers = ["First name", "Last name", "Address"]
+    table_data = [
+        ["Rick", "Nash", "IceHockey Road\n7260 Davos"],
+        ["Grumpy", "Cat", "Reddit\nThe frontpage of\nthe internet"]
+    ]
+    pages = Table(headers, table_data, max_table_width=None).draw_pages(page_width=35, key_columns=1)
+    expected_str = ('+------------+-----------+\n'
+                    '| First name | Last name |\n'
+                    '+============+===========+\n'
+                    '| Rick       | Nash      |\n'
+                    '+------------+-----------+\n'
+                    '| Grumpy     | Cat       |\n'
+                    '+------------+-----------+')
+    assert next(pages) == expected_str, 'first page does not match'
+    expected_str = ('+------------+------------------+\n'
+                    '| First name | Address          |\n'
+                    '+============+==================+\n'
+                    '| Rick       | IceHockey Road   |\n'
+                    '|            | 7260 Davos       |\n'
+                    '+------------+------------------+\n'
+                    '| Grumpy     | Reddit           |\n'
+                    '|            | The frontpage of |\n'
+                    '|            | the internet     |\n'
+                    '+------------+------------------+')
+    assert next(pages) == expected_str, 'second page does not match'
+    assert next(pages, None) is None, 'too many pages'
+
+
+def test_draw_pages_single_page():
+    table = dummy_table(column_keys=DUMMY_COLUMN_KEYS, max_table_width=None)
+    assert list(table.draw_pages(page_width=1000)) == [table.draw()]
+
+
+def test_draw_to():
+    table = dummy_table(column_keys=DUMMY_COLUMN_KEYS, newline='\r\n')
+    stream = io.StringIO()
+    table.draw_to(stream)
+    assert stream.getvalue() == table.draw(), 'draw_to output does not match'
+
+
+def test_lazy_table_draws_on_str():
+    lazy_table = LazyTable(DUMMY_HEADERS, {})  # no data, but no error yet
+    with pytest.raises(SimpleTableError):
+        str(lazy_table)
+
+    lazy_table = LazyTable(DUMMY_HEADERS, DUMMY_DATA, column_keys=DUMMY_COLUMN_KEYS)
+    table_str = str(lazy_table)
+    assert table_str == dummy_table(column_keys=DUMMY_COLUMN_KEYS, max_table_width=None).draw()
+    assert str(lazy_table) is table_str, 'drawn table is not memoized'
+
+
+@pytest.mark.parametrize('msg_args_expected', [
+    ('%s',          ('T',),             'T'),
+    ('a %s b %s',   ('T', 'T'),         'a T b T'),
+    ('%d: %s',      (1, 'T'),           '1: T'),
+    ('no tables',   (),                 'no tables'),
+    ('%r',          ('T',),             None),  # falls back to repr
+    ('%20s',        ('T',),             None),  # falls back to a padded string
+    ('%.2s',        ('T',),             None),
+    ('%*s %s',      (3, 'x', 'T'),      '  x T'),
+    ('%s %-4s',     ('T', 'T'),         None),
+    ('%% %s',       ('T',),             '% T'),
+])
+def test_table_stream_handler(msg_args_expected):
+    msg, args, expected = msg_args_expected
+    check_table_stream_handler(msg, args, expected, TableFormatter('%(levelname)s %(message)s'))
+
+
+@pytest.mark.parametrize('fmt_style_plain', [
+    ('%(levelname)s %(message)s',       '%',    True),
+    ('%(message)s %(message)s',         '%',    True),
+    ('%(message).20s',                  '%',    False),
+    ('%(message)s %(message)r',         '%',    False),
+    ('%(levelname)s',                   '%',    False),
+    ('{levelname} {message}',           '{',    True),
+    ('{message:>20}',                   '{',    False),
+    ('{message!r}',                     '{',    False),
+    ('$levelname ${message}',           '$',    True),
+    ('$levelname $message',             '$',    True),
+    ('$$message $levelname',            '$',    False),
+])
+def test_table_stream_handler_formats(fmt_style_plain):
+    fmt, style, plain = fmt_style_plain
+    formatter = TableFormatter(fmt, style=style)
+    assert formatter._message_is_plain() == plain
+    check_table_stream_handler('T=%s', ('T',), None, formatter)
+
+
+def check_table_stream_handler(msg, args, expected, formatter):
+    """Logs msg % args through a TableStreamHandler, expected defaults to formatter.format()"""
+    lazy_table = LazyTable(DUMMY_HEADERS, DUMMY_DATA, column_keys=DUMMY_COLUMN_KEYS)
+    args = tuple(lazy_table if arg == 'T' else arg for arg in args)
+
+    stream = io.StringIO()
+    handler = TableStreamHandler(stream)
+    handler.setFormatter(formatter)
+    record = logging.makeLogRecord({'msg': msg, 'args': args, 'levelname': 'WARNING'})
+    handler.handle(record)
+
+    if expected is None:
+        expected = formatter.format(record) + '\n'
+    else:
+        expected = 'WARNING ' + expected.replace('T', str(lazy_table)) + '\n'
+    assert stream.getvalue() == expected, 'logged table does not match'
+
+
+def test_lazy_table_not_drawn_if_not_logged():
+    lazy_table = LazyTable(DUMMY_HEADERS, DUMMY_DATA, column_keys=DUMMY_COLUMN_KEYS)
+    logger = logging.getLogger('draw_table.test')
+    logger.addHandler(TableStreamHandler(io.StringIO()))
+    logger.setLevel(logging.INFO)
+    try:
+        logger.debug('%s', lazy_table)
+    finally:
+        logger.handlers.clear()
+        logger.setLevel(logging.NOTSET)
+    assert lazy_table._drawn is None, 'table drawn while not logged'
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+@pytest.mark.parametrize('encoding', ['utf-8', 'utf-8-sig', 'utf-16', 'utf-16-be'])
+@pytest.mark.parametrize('with_index', [True, False])
+def test_draw_to_file(tmpdir, newline, encoding, with_index):
+    table_path = str(tmpdir.join('table.txt'))
+    index_path = str(tmpdir.join('table.idx')) if with_index else None
+    table_data = [['Rick', 'Nash', 'IceHockey Road{}7260 Davos'.format(newline)],
+                  ['Grumpy', 'Cat', 'Reddit'],
+                  ['Grüezi', 'Käse', 'Zürich{0}{0}Schweiz'.format(newline)]]
+    table = Table(DUMMY_HEADERS, table_data, newline=newline, max_table_width=None)
+    table.draw_to_file(table_path, index_path, encoding=encoding)
+
+    with open(table_path, 'rb') as table_file:
+        assert table_file.read().decode(encoding) == table.draw(), 'table file does not match'
+    if not with_index:
+        return
+
+    row_separator = newline + table.row_separator
+    with TableFileReader(table_path, index_path, encoding=encoding) as reader:
+        assert len(reader) == len(table_data)
+        for row_index, row in enumerate(table_data):
+            expected = table._build_row(row) + row_separator
+            assert reader.get_rows(row_index) == expected, 'row does not match'
+            assert reader.get_rows(row_index - len(table_data)) == expected, 'negative index does not match'
+        assert reader.get_rows(1, 3) == reader.get_rows(1) + newline + reader.get_rows(2)
+        assert reader.get_rows(-2, None) == reader.get_rows(1)
+        assert reader.get_rows(-2, -1) == reader.get_rows(1)
+        assert reader.get_rows(0, 100) == table.draw().split(table.header_row_separator + newline)[1]
+        assert reader.get_rows(5) == ''
+        assert reader.get_rows(-5) == ''
+
+
+@pytest.mark.parametrize('max_table_width', ['wide', [80]])
+def test_max_table_width_not_integer(max_table_width):
+    with pytest.raises(SimpleTableError):
+        dummy_table(max_table_width=max_table_width)
+
+
+@pytest.mark.parametrize('stdout', [None, 'closed'])
+def test_max_table_width_without_stdout(monkeypatch, stdout):
+    if stdout == 'closed':
+        stdout = io.StringIO()
+        stdout.close()
+    monkeypatch.setattr('sys.stdout', stdout)
+    assert get_terminal_width() is None
+
+
+@pytest.mark.parametrize('page_width_max_width_keys', [
+    (25,    None,   0),
+    (25,    20,     0),     # max_table_width is narrower
+    (25,    None,   1),     # key column wider than the page
+    (None,  20,     0),
+])
+def test_draw_pages_wide_columns(page_width_max_width_keys):
+    page_width, max_table_width, key_columns = page_width_max_width_keys
+    table = Table(['a', 'b'], [['x' * 30, 'y' * 30]], max_table_width=max_table_width)
+    pages = list(table.draw_pages(page_width, key_columns))
+    width = min(width for width in (page_width, max_table_width) if width is not None)
+    assert len(pages) == 2 - key_columns
+    for page in pages:
+        assert all(len(line) <= width for line in page.split('\n')), 'page too wide'
+        assert '...' in page, 'long value not truncated'
+
+
+def test_draw_table_pages():
+    pages = draw_table_pages(DUMMY_HEADERS, DUMMY_DATA, 9, key_columns=1,
+                             column_keys=DUMMY_COLUMN_KEYS, corner_char='*', max_table_width=None)
+    assert list(pages) == ['*---*---*\n| 4 | 5 |\n*===*===*\n| d | e |\n*---*---*',
+                           '*---*---*\n| 4 | 6 |\n*===*===*\n| d | f |\n*---*---*']
+
+
+class TerminalStdout(io.StringIO):
+    """stdout of a terminal"""
+
+    def isatty(self):
+        return True
+
+
+def test_terminal_width_only_for_draw(tmpdir, monkeypatch):
+    # stdout is patched here: pytest output capturing replaces it before each test call
+    monkeypatch.setattr(Table, '_get_terminal_width', staticmethod(get_terminal_width))
+    monkeypatch.setattr('sys.stdout', TerminalStdout())
+    monkeypatch.setattr('shutil.get_terminal_size', lambda: os.terminal_size((30, 24)))
+
+    table_data = [['x' * 80]]
+    table = Table(['a'], table_data)
+    assert table.max_table_width == 30
+    assert '...' in table.draw(), 'draw() not fitted to the terminal'
+
+    stream = io.StringIO()
+    table.draw_to(stream)
+    assert 'x' * 80 in stream.getvalue(), 'draw_to() truncated values'
+
+    table_path = str(tmpdir.join('table.txt'))
+    index_path = str(tmpdir.join('table.idx'))
+    table.draw_to_file(table_path, index_path)
+    with TableFileReader(table_path, index_path) as reader:
+        assert 'x' * 80 in reader.get_rows(0), 'draw_to_file() truncated values'
+
+    # an explicit max_table_width applies
+    stream = io.StringIO()
+    Table(['a'], table_data, max_table_width=30).draw_to(stream)
+    assert 'x' * 80 not in stream.getvalue()